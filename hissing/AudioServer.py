@@ -0,0 +1,534 @@
+"""
+Runs a Manager in a child process, so decoding and streaming do not
+compete for the interpreter lock of the main process.
+
+The client side, RemoteManager and RemoteSound, sends the frequent
+commands (play, stop, volume...) through a CommandRing in shared memory
+and reads back the state of the sounds from a mirror array that the
+server keeps updated. Rare requests that need an answer, like creating a
+sound, go through a pipe.
+"""
+import ctypes
+import struct
+from multiprocessing import Pipe, Process
+from multiprocessing.sharedctypes import RawArray
+from threading import Lock
+from time import sleep
+from warnings import warn
+from weakref import WeakSet, ref
+
+from .Automation import CURVES
+from .Scheduler import clock
+from .Sound import Sound, StatesEnum
+from .SoundManager import Manager
+
+# op, sound slot, three arguments
+_RECORD = struct.Struct('<BxxxIddd')
+
+(_PLAY, _PAUSE, _STOP, _REWIND, _CLOSE, _VOLUME, _PITCH, _POSITION, _VELOCITY, _LOOPED, _FADE,
+ _LISTENER_POSITION) = range(12)
+
+# slot of the commands that do not target a sound
+_NO_SLOT = 0xFFFFFFFF
+
+_CURVE_NAMES = sorted(CURVES)
+
+# mirrored fields of each sound: state, time, length
+_MIRROR_FIELDS = 3
+_STATES = [StatesEnum.Initial, StatesEnum.Playing, StatesEnum.Paused, StatesEnum.Stopped]
+_CLOSED = -1.0
+
+
+class CommandRing(object):
+    """
+    Single producer, single consumer ring of fixed size commands in shared
+    memory. No lock is taken: only the producer moves ``head`` and only the
+    consumer moves ``tail``, and a record is written before ``head`` is
+    published.
+    """
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self._data = RawArray(ctypes.c_char, capacity * _RECORD.size)
+        # head, tail
+        self._indices = RawArray(ctypes.c_ulonglong, 2)
+
+    def __len__(self):
+        return self._indices[0] - self._indices[1]
+
+    def put(self, op, slot, a=0.0, b=0.0, c=0.0):
+        """Returns False, without writing, if the ring is full."""
+        indices = self._indices
+        head = indices[0]
+        if head - indices[1] >= self.capacity:
+            return False
+        _RECORD.pack_into(self._data, (head % self.capacity) * _RECORD.size, op, slot, a, b, c)
+        indices[0] = head + 1
+        return True
+
+    def get(self):
+        """Returns the oldest command, or None if the ring is empty."""
+        indices = self._indices
+        tail = indices[1]
+        if tail == indices[0]:
+            return None
+        record = _RECORD.unpack_from(self._data, (tail % self.capacity) * _RECORD.size)
+        indices[1] = tail + 1
+        return record
+
+
+class AudioServer(object):
+    """The side living in the child process. It owns the Manager and all the Sounds."""
+
+    def __init__(self, ffmpegPath, ring, mirror, connection, maxSounds, pollInterval, mirrorInterval):
+        self._ring = ring
+        self._mirror = mirror
+        self._connection = connection
+        self._pollInterval = pollInterval
+        self._mirrorInterval = mirrorInterval
+        self._sounds = {}
+        self._freeSlots = list(range(maxSounds - 1, -1, -1))
+        self.isFinished = False
+        self._manager = Manager(ffmpegPath)
+
+    def serve(self):
+        connection = self._connection
+        nextMirror = clock()
+        try:
+            while not self.isFinished:
+                self._runCommands()
+                if connection.poll(self._pollInterval):
+                    request = connection.recv()
+                    # commands sent before the request must be applied first
+                    self._runCommands()
+                    try:
+                        reply = self._handle(*request)
+                    except Exception as err:
+                        reply = err
+                    connection.send(reply)
+                if clock() >= nextMirror:
+                    self._updateMirror()
+                    nextMirror = clock() + self._mirrorInterval
+        finally:
+            self._manager.terminate()
+            connection.close()
+
+    def _runCommands(self):
+        ring = self._ring
+        record = ring.get()
+        while record is not None:
+            try:
+                self._run(*record)
+            except Exception as err:
+                warn(str(err))
+            record = ring.get()
+
+    def _run(self, op, slot, a, b, c):
+        if op == _LISTENER_POSITION:
+            self._manager.listener.position = (a, b, c)
+            return
+        sound = self._sounds.get(slot)
+        if sound is None:
+            return
+        if op == _PLAY:
+            sound.play()
+        elif op == _PAUSE:
+            sound.pause()
+        elif op == _STOP:
+            sound.stop()
+        elif op == _REWIND:
+            sound.rewind()
+        elif op == _CLOSE:
+            self._close(slot)
+        elif op == _VOLUME:
+            sound.volume = a
+        elif op == _PITCH:
+            sound.pitch = a
+        elif op == _POSITION:
+            sound.position = (a, b, c)
+        elif op == _VELOCITY:
+            sound.velocity = (a, b, c)
+        elif op == _LOOPED:
+            sound.looped = bool(a)
+        elif op == _FADE:
+            sound.fadeTo(a, b, _CURVE_NAMES[int(c)])
+        else:
+            raise RuntimeError('unknown command ' + str(op))
+
+    def _handle(self, request, *args):
+        if request == 'create':
+            return self._create(*args)
+        elif request == 'copy':
+            return self._create(self._sounds[args[0]])
+        elif request == 'preload':
+            return self._preload(*args)
+        elif request == 'playGroup':
+            slots, at = args
+            self._manager.playGroup([self._sounds[slot] for slot in slots], at)
+            return True
+        elif request == 'crossfade':
+            fromSlot, toSlot, seconds, volume, curve = args
+            self._manager.crossfade(self._sounds[fromSlot], self._sounds[toSlot], seconds, volume, curve)
+            return True
+        elif request == 'resources':
+            return self._manager.resources()
+        elif request == 'ready':
+            return True
+        elif request == 'terminate':
+            self.isFinished = True
+            return True
+        raise RuntimeError('unknown request ' + str(request))
+
+    def _create(self, source, *args):
+        if not self._freeSlots:
+            raise RuntimeError('too many remote sounds')
+        if isinstance(source, Sound):
+            sound = source.copy()
+        else:
+            sound = Sound(self._manager, source, *args)
+        slot = self._freeSlots.pop()
+        self._sounds[slot] = sound
+        self._mirrorSound(slot, sound)
+        return slot
+
+    def _preload(self, filePaths, bufferSize, ignoreErrors):
+        if len(filePaths) > len(self._freeSlots):
+            raise RuntimeError('too many remote sounds')
+        slots = []
+        for sound in self._manager.preload(filePaths, bufferSize, ignoreErrors):
+            if sound is None:
+                slots.append(None)
+                continue
+            slot = self._freeSlots.pop()
+            self._sounds[slot] = sound
+            self._mirrorSound(slot, sound)
+            slots.append(slot)
+        return slots
+
+    def _close(self, slot):
+        sound = self._sounds.pop(slot)
+        sound.close()
+        self._mirror[slot * _MIRROR_FIELDS] = _CLOSED
+        self._freeSlots.append(slot)
+
+    def _mirrorSound(self, slot, sound):
+        offset = slot * _MIRROR_FIELDS
+        mirror = self._mirror
+        mirror[offset] = _STATES.index(sound.state)
+        mirror[offset + 1] = sound.time
+        length = sound.length
+        mirror[offset + 2] = float('nan') if length is None else length
+
+    def _updateMirror(self):
+        for slot, sound in list(self._sounds.items()):
+            try:
+                self._mirrorSound(slot, sound)
+            except Exception as err:
+                warn(str(err))
+
+
+def _serve(ffmpegPath, ring, mirror, connection, maxSounds, pollInterval, mirrorInterval):
+    try:
+        server = AudioServer(ffmpegPath, ring, mirror, connection, maxSounds, pollInterval, mirrorInterval)
+    except Exception as err:
+        # let the client know why the server could not start
+        connection.recv()
+        connection.send(err)
+        connection.close()
+        return
+    server.serve()
+
+
+class RemoteManager(object):
+    """
+    Starts a Manager in a child process and controls it. Use it like a
+    Manager, creating RemoteSound objects instead of Sound objects.
+    """
+
+    def __init__(self, ffmpegPath='ffmpeg', maxSounds=1024, ringCapacity=4096, pollInterval=0.001,
+                 mirrorInterval=0.01):
+        self._process = None
+        self._listener = RemoteListener(self)
+        self._closed = False
+        self._sounds = WeakSet()
+        self._ringLock = Lock()
+        self._requestLock = Lock()
+        self._ring = CommandRing(ringCapacity)
+        self._mirror = RawArray(ctypes.c_double, maxSounds * _MIRROR_FIELDS)
+        self._connection, childConnection = Pipe()
+
+        self._process = Process(target=_serve, args=(ffmpegPath, self._ring, self._mirror, childConnection, maxSounds,
+                                                     pollInterval, mirrorInterval))
+        self._process.daemon = True
+        self._process.start()
+        childConnection.close()
+        # waits until the device is open, raising whatever went wrong
+        try:
+            self._request('ready')
+        except Exception:
+            self._closed = True
+            self._connection.close()
+            self._process.join()
+            raise
+
+    def _request(self, *request):
+        with self._requestLock:
+            if self._closed:
+                raise RuntimeError('the audio server was terminated')
+            self._connection.send(request)
+            reply = self._connection.recv()
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    def _send(self, op, slot, a=0.0, b=0.0, c=0.0):
+        # the ring has a single producer, threads of this process take turns
+        with self._ringLock:
+            while not self._ring.put(op, slot, a, b, c):
+                if not self._process.is_alive():
+                    raise RuntimeError('the audio server is not running')
+                sleep(0)
+
+    def _readMirror(self, slot):
+        offset = slot * _MIRROR_FIELDS
+        return self._mirror[offset:offset + _MIRROR_FIELDS]
+
+    @property
+    def listener(self):
+        return self._listener
+
+    @property
+    def clock(self):
+        """Current time, in seconds, of the clock used by ``at`` arguments. The server shares it."""
+        return clock()
+
+    def playGroup(self, sounds, at=None):
+        """Starts all the sounds with a single AL call in the server, see Manager.playGroup.
+
+        The start can not be cancelled from the client.
+        """
+        self._request('playGroup', [sound._slot for sound in sounds], at)
+
+    def crossfade(self, fromSound, toSound, seconds, volume=100, curve='equalPower'):
+        self._request('crossfade', fromSound._slot, toSound._slot, seconds, volume, curve)
+        fromSound._volume = 0
+        toSound._volume = volume
+
+    def preload(self, filePaths, bufferSize=48000, ignoreErrors=False):
+        """Creates a RemoteSound for each of ``filePaths``, decoded by the pool of the server, see Manager.preload.
+
+        With ``ignoreErrors`` the warnings about the failed files are issued by the server process.
+        """
+        slots = self._request('preload', [_sendable(filePath) for filePath in filePaths], bufferSize, ignoreErrors)
+        return [None if slot is None else RemoteSound._attach(self, slot) for slot in slots]
+
+    def resources(self):
+        return self._request('resources')
+
+    def terminate(self):
+        if self._closed or self._process is None:
+            return
+        for sound in list(self._sounds):
+            sound._closed = True
+        try:
+            self._request('terminate')
+        finally:
+            self._closed = True
+            self._connection.close()
+            self._process.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.terminate()
+
+    def __del__(self):
+        try:
+            self.terminate()
+        except Exception as err:
+            warn(str(err))
+
+
+def _sendable(filePath):
+    if hasattr(filePath, 'read'):
+        # file objects can not be sent to the server
+        return filePath.read()
+    elif not isinstance(filePath, (str, bytes)) and not hasattr(filePath, '__fspath__'):
+        return bytes(memoryview(filePath))
+    return filePath
+
+
+class RemoteListener(object):
+    def __init__(self, manager):
+        # the manager owns the listener, a strong reference would make a cycle
+        self._manager = ref(manager)
+        self._position = [0, 0, 0]
+
+    @property
+    def position(self):
+        return list(self._position)
+
+    @position.setter
+    def position(self, value):
+        valLen = len(value)
+        if valLen != 3:
+            raise ValueError('wrong number of elements. Expected 3, got ' + str(valLen))
+        x, y, z = value
+        self._manager()._send(_LISTENER_POSITION, _NO_SLOT, x, y, z)
+        self._position = [x, y, z]
+
+
+class RemoteSound(object):
+    """
+    Proxy of a Sound living in the audio server. Commands are queued and
+    return at once; ``state``, ``time`` and ``length`` are read from the
+    mirror, so they lag the server by up to its mirror interval.
+    """
+
+    def __init__(self, manager, filePath, isStream=False, bufferSize=48000, maxBufferNumber=3, lookAhead=2.0):
+        self._init(manager)
+        if isinstance(filePath, RemoteSound):
+            slot = manager._request('copy', filePath._slot)
+        else:
+            slot = manager._request('create', _sendable(filePath), isStream, bufferSize, maxBufferNumber, lookAhead)
+        self._open(slot)
+
+    def _init(self, manager):
+        self._closed = True
+        self._manager = manager
+        # values last sent to the server
+        self._volume = 100
+        self._pitch = 100
+        self._looped = False
+        self._position = [0, 0, 0]
+        self._velocity = [0, 0, 0]
+
+    def _open(self, slot):
+        self._slot = slot
+        self._closed = False
+        self._manager._sounds.add(self)
+
+    @classmethod
+    def _attach(cls, manager, slot):
+        """Proxy of a sound already created in the server."""
+        sound = cls.__new__(cls)
+        sound._init(manager)
+        sound._open(slot)
+        return sound
+
+    def _send(self, op, a=0.0, b=0.0, c=0.0):
+        if self._closed:
+            raise RuntimeError('the sound is closed')
+        self._manager._send(op, self._slot, a, b, c)
+
+    def play(self):
+        self._send(_PLAY)
+
+    def pause(self):
+        self._send(_PAUSE)
+
+    def stop(self):
+        self._send(_STOP)
+
+    def rewind(self):
+        self._send(_REWIND)
+
+    def fadeTo(self, volume, seconds, curve='linear'):
+        self._send(_FADE, volume, seconds, _CURVE_NAMES.index(curve))
+        self._volume = volume
+
+    @property
+    def looped(self):
+        return self._looped
+
+    @looped.setter
+    def looped(self, value):
+        self._send(_LOOPED, 1.0 if value else 0.0)
+        self._looped = bool(value)
+
+    @property
+    def volume(self):
+        return self._volume
+
+    @volume.setter
+    def volume(self, value):
+        self._send(_VOLUME, value)
+        self._volume = value
+
+    @property
+    def pitch(self):
+        return self._pitch
+
+    @pitch.setter
+    def pitch(self, value):
+        self._send(_PITCH, value)
+        self._pitch = value
+
+    @property
+    def position(self):
+        return list(self._position)
+
+    @position.setter
+    def position(self, value):
+        x, y, z = value
+        self._send(_POSITION, x, y, z)
+        self._position = [x, y, z]
+
+    @property
+    def velocity(self):
+        return list(self._velocity)
+
+    @velocity.setter
+    def velocity(self, value):
+        x, y, z = value
+        self._send(_VELOCITY, x, y, z)
+        self._velocity = [x, y, z]
+
+    @property
+    def state(self):
+        return _STATES[int(self._readMirror()[0])]
+
+    @property
+    def time(self):
+        return self._readMirror()[1]
+
+    @property
+    def length(self):
+        length = self._readMirror()[2]
+        if length != length:
+            # not known yet, see Sound.length
+            return None
+        return length
+
+    def _readMirror(self):
+        # the slot may already belong to another sound
+        if self._closed:
+            raise RuntimeError('the sound is closed')
+        return self._manager._readMirror(self._slot)
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def close(self):
+        if self._closed:
+            return
+        self._send(_CLOSE)
+        self._closed = True
+        self._manager._sounds.discard(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception as err:
+            warn(str(err))
+
+    def copy(self):
+        return RemoteSound(self._manager, self)
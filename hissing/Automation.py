@@ -0,0 +1,180 @@
+from math import cos, exp, sin, pi
+from threading import Lock
+from warnings import warn
+
+from openal.al import *
+
+from .Scheduler import clock
+from .Sound import StatesEnum
+from ._errorChecking import _checkError as _ckerr
+
+# steepness of the exponential curve
+_EXP_K = 5.0
+
+CURVES = {'linear'       : lambda x: x,
+          'smooth'       : lambda x: x * x * (3 - 2 * x),
+          'exponential'  : lambda x: (exp(_EXP_K * x) - 1) / (exp(_EXP_K) - 1),
+          'equalPowerIn' : lambda x: sin(x * pi / 2),
+          'equalPowerOut': lambda x: 1 - cos(x * pi / 2)}
+
+# parameter name -> (number of components, AL enum, scale from the Sound value to the AL value)
+PARAMETERS = {'volume'  : (1, AL_GAIN, 0.01),
+              'pitch'   : (1, AL_PITCH, 0.01),
+              'position': (3, AL_POSITION, 1.0)}
+
+
+def _getCurve(curve):
+    if callable(curve):
+        return curve
+    try:
+        return CURVES[curve]
+    except KeyError:
+        raise ValueError('unknown curve \'{}\'. Available: {}'.format(curve, ', '.join(sorted(CURVES))))
+
+
+class Ramp(object):
+    def __init__(self, sound, parameter, start, end, startTime, duration, curve, onFinished=None):
+        self.sound = sound
+        self.parameter = parameter
+        self.start = start
+        self.end = end
+        self.startTime = startTime
+        self.duration = duration
+        self.curve = curve
+        self.onFinished = onFinished
+
+    def progress(self, now):
+        if self.duration <= 0:
+            return 1.0
+        return min(1.0, max(0.0, (now - self.startTime) / self.duration))
+
+
+class Automation(object):
+    """
+    Time based ramps of volume, pitch and position for many sounds.
+
+    All the active ramps are evaluated together on each tick of the
+    scheduler of the manager, and the resulting source updates are sent
+    as one batch with a single error check. The ticks only run while
+    there are active ramps.
+    """
+
+    def __init__(self, manager, interval=0.01):
+        self._manager = manager
+        self._device = manager._device
+        self.interval = interval
+        self._ramps = {}
+        self._lock = Lock()
+        self._pendingTick = None
+
+    @property
+    def active(self):
+        return len(self._ramps)
+
+    def ramp(self, sound, parameter, end, seconds, curve='linear', start=None, onFinished=None):
+        """Changes ``parameter`` of ``sound`` from ``start`` (current value by default) to ``end`` in ``seconds``.
+
+        It replaces any ramp already running on the same parameter of the sound. ``onFinished`` is called from the
+        scheduler thread when the ramp ends.
+        """
+        try:
+            components = PARAMETERS[parameter][0]
+        except KeyError:
+            raise ValueError('parameter \'{}\' can not be automated'.format(parameter))
+        curve = _getCurve(curve)
+        if start is None:
+            start = getattr(sound, parameter)
+        if components == 1:
+            start, end = [float(start)], [float(end)]
+        else:
+            start, end = [float(v) for v in start], [float(v) for v in end]
+            if len(start) != components or len(end) != components:
+                raise ValueError('wrong number of elements. Expected ' + str(components))
+
+        ramp = Ramp(sound, parameter, start, end, clock(), float(seconds), curve, onFinished)
+        with self._lock:
+            self._ramps[(id(sound), parameter)] = ramp
+            if self._pendingTick is None:
+                self._pendingTick = self._manager._getScheduler().schedule(clock(), self._tick, precise=False)
+        return ramp
+
+    def crossfade(self, fromSound, toSound, seconds, volume=100, curve='equalPower'):
+        """Fades ``fromSound`` out and ``toSound`` in, starting it if needed. ``fromSound`` is stopped at the end."""
+        if curve == 'equalPower':
+            curveOut, curveIn = 'equalPowerOut', 'equalPowerIn'
+        else:
+            curveOut = curveIn = curve
+        self.ramp(fromSound, 'volume', 0, seconds, curveOut, onFinished=fromSound.stop)
+        if toSound.state != StatesEnum.Playing:
+            # the first tick runs later on the scheduler thread, it must not start at its previous volume
+            toSound.volume = 0
+            toSound.play()
+        self.ramp(toSound, 'volume', volume, seconds, curveIn, start=0)
+
+    def cancel(self, sound, parameter=None):
+        """Stops the ramps of ``sound``, leaving the parameters at their current value."""
+        with self._lock:
+            for key in list(self._ramps):
+                ramp = self._ramps[key]
+                if ramp.sound is sound and (parameter is None or ramp.parameter == parameter):
+                    del self._ramps[key]
+
+    def terminate(self):
+        with self._lock:
+            self._ramps.clear()
+            if self._pendingTick is not None:
+                self._pendingTick.cancel()
+                self._pendingTick = None
+
+    def _tick(self):
+        now = clock()
+        finished = []
+        # Sound.close() cancels its ramps with this lock held, so no source can be deleted while the batch is sent
+        with self._lock:
+            # evaluate every ramp first, then send all the updates in one batch
+            updates = []
+            for key, ramp in list(self._ramps.items()):
+                sound = ramp.sound
+                if sound.closed:
+                    finished.append((key, ramp))
+                    continue
+                progress = ramp.progress(now)
+                factor = ramp.curve(progress)
+                scale = PARAMETERS[ramp.parameter][2]
+                values = [(s + (e - s) * factor) * scale for s, e in zip(ramp.start, ramp.end)]
+                updates.append((sound._sourceID, PARAMETERS[ramp.parameter][1], values))
+                if progress >= 1.0:
+                    finished.append((key, ramp))
+
+            for sourceID, param, values in updates:
+                # a failing update must not hold back the rest of the batch
+                try:
+                    if len(values) == 1:
+                        alSourcef(sourceID, param, values[0])
+                    else:
+                        alSource3f(sourceID, param, *values)
+                except Exception as err:
+                    warn(str(err))
+            if updates:
+                try:
+                    self._checkError()
+                except Exception as err:
+                    warn(str(err))
+
+            for key, ramp in finished:
+                del self._ramps[key]
+            if self._ramps:
+                self._pendingTick = self._manager._getScheduler().schedule(now + self.interval, self._tick,
+                                                                           precise=False)
+            else:
+                self._pendingTick = None
+
+        for key, ramp in finished:
+            if ramp.onFinished is not None and not ramp.sound.closed:
+                try:
+                    ramp.onFinished()
+                except Exception as err:
+                    warn(str(err))
+
+    def _checkError(self):
+        _ckerr(self._device)
@@ -0,0 +1,77 @@
+import heapq
+from itertools import count
+from threading import Thread, Condition, current_thread
+from warnings import warn
+
+try:
+    from time import monotonic as clock
+except ImportError:
+    from time import time as clock
+
+# the last part of a wait is spun instead of slept, timed waits tend to wake up late
+_SPIN_TIME = 0.002
+
+
+class ScheduledCall(object):
+    def __init__(self, at, callback, precise=True):
+        self.at = at
+        self.callback = callback
+        self.precise = precise
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Scheduler(Thread):
+    """Runs callbacks at given times of ``clock()`` from a single thread."""
+
+    def __init__(self):
+        super(Scheduler, self).__init__()
+        self.daemon = True
+        self._calls = []
+        self._counter = count()
+        self._condition = Condition()
+        self.isFinished = False
+
+    def schedule(self, at, callback, precise=True):
+        """Calls ``callback`` at ``at``. Non precise calls may run a bit late, but do not spin."""
+        call = ScheduledCall(at, callback, precise)
+        with self._condition:
+            heapq.heappush(self._calls, (at, next(self._counter), call))
+            self._condition.notify()
+        return call
+
+    def run(self):
+        condition = self._condition
+        while True:
+            with condition:
+                while not self.isFinished and not self._calls:
+                    condition.wait()
+                if self.isFinished:
+                    return
+                at, _, call = self._calls[0]
+                spinTime = _SPIN_TIME if call.precise else 0
+                remaining = at - clock()
+                if remaining > spinTime:
+                    # a call scheduled meanwhile may be due sooner
+                    condition.wait(remaining - spinTime)
+                    continue
+                heapq.heappop(self._calls)
+
+            while clock() < at:
+                pass
+            if not call.cancelled:
+                try:
+                    call.callback()
+                except Exception as err:
+                    warn(str(err))
+
+    def terminate(self):
+        with self._condition:
+            self.isFinished = True
+            self._calls = []
+            self._condition.notify()
+        # a callback may terminate the manager from this very thread
+        if self.is_alive() and self is not current_thread():
+            self.join()
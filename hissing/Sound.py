@@ -1,6 +1,9 @@
+from collections import deque
 from ctypes import byref
+from math import ceil
+from time import sleep
 from warnings import warn
-from threading import Thread
+from threading import Thread, Condition, current_thread
 
 from openal.al import *
 from openal.al import alDeleteBuffers as delBuff
@@ -33,21 +36,31 @@ class StatesEnum(object):
 
 
 class Sound(object):
-    def __init__(self, manager, filePath, isStream=False, bufferSize=48000, maxBufferNumber=3):
-        self._filePath = filePath
+    def __init__(self, manager, filePath, isStream=False, bufferSize=48000, maxBufferNumber=3, lookAhead=2.0,
+                 reader=None):
+        self._closed = False
+        self._sourceID = None
+        self._bufferID = None
+        self.filler = None
         self._manager = manager
         self._isStream = isStream
         self._device = manager._device
         self._bufferSize = bufferSize
+        self._maxBufferNumber = maxBufferNumber
+        self._lookAhead = lookAhead
         self._ffmpegPath = manager._ffmpegPath
 
         if isinstance(filePath, Sound):
             shareBufferFrom = filePath
-            filePath = shareBufferFrom.filePath
+            filePath = shareBufferFrom._filePath
+            if isStream and hasattr(filePath, 'read'):
+                # both readers would seek and read the same file object
+                raise ValueError('streams read from a file object can not be copied, use a path or bytes instead')
         else:
             shareBufferFrom = None
+        self._filePath = filePath
 
-        manager._sounds.append(self)
+        manager._sounds.add(self)
 
         # create a source
         sourceID = ALuint()
@@ -55,33 +68,52 @@ class Sound(object):
         self._checkError()
         self._sourceID = sourceID
 
-        # create the frames extractor
-        reader = FFMPEG_AudioReader(self._ffmpegPath, filePath, bufferSize, nbytes=2)
+        if shareBufferFrom is not None and not isStream:
+            # the decoded data is already on a buffer, no need to run ffmpeg again
+            self._fps = shareBufferFrom._fps
+            self._nframes = shareBufferFrom._nframes
+            bufferID = ALuint(shareBufferFrom._bufferID.value)
+            manager._retainBuffer(bufferID.value)
+            self._bufferID = bufferID
+            alSourcei(sourceID, AL_BUFFER, bufferID.value)
+            self._checkError()
+            return
+
+        # create the frames extractor, unless it comes already opened (see Manager.preload)
+        if reader is None:
+            reader = FFMPEG_AudioReader(self._ffmpegPath, filePath, bufferSize, nbytes=2)
+        manager._readers.add(reader)
         self._fps = reader.fps
         self._nframes = reader.nframes
 
         # read chunk or all file
         if isStream:
-            self.filler = BufferFillingThread(manager._device, sourceID, bufferSize, maxBufferNumber, reader)
+            self.filler = BufferFillingThread(manager._device, sourceID, bufferSize, maxBufferNumber, reader,
+                                              lookAhead)
             self.filler.start()
         else:
-            if shareBufferFrom is None:
-                totalBytes = reader.read_chunk(bufferSize)
-                while reader.pos < reader.nframes:
-                    totalBytes += reader.read_chunk(bufferSize)
-
-                # create a buffer
-                bufferID = ALuint()
-                alGenBuffers(1, byref(bufferID))
-                self._checkError()
-                # upload data to buffer
-                alBufferData(bufferID, to_al_format(reader.nchannels, 8 * reader.nbytes), totalBytes, len(totalBytes),
-                             reader.fps)
-                self._checkError()
-            else:
-                bufferID = ALuint(shareBufferFrom._bufferID)
-
+            try:
+                chunks = [reader.read_chunk(bufferSize)]
+                while not reader.eof:
+                    chunks.append(reader.read_chunk(bufferSize))
+            finally:
+                # everything is decoded, the ffmpeg process is not needed anymore
+                reader.close_proc()
+            totalBytes = b''.join(chunks)
+            # exact length, the duration reported by ffmpeg is rounded or missing for piped inputs
+            self._nframes = reader.pos
+
+            # create a buffer
+            bufferID = ALuint()
+            alGenBuffers(1, byref(bufferID))
+            self._checkError()
+            manager._retainBuffer(bufferID.value)
             self._bufferID = bufferID
+            # upload data to buffer
+            alBufferData(bufferID, to_al_format(reader.nchannels, 8 * reader.nbytes), totalBytes, len(totalBytes),
+                         reader.fps)
+            self._checkError()
+
             # bind source
             alSourcei(sourceID, AL_BUFFER, bufferID.value)
             self._checkError()
@@ -127,19 +159,59 @@ class Sound(object):
 
     @time.setter
     def time(self, value):
-        raise NotImplementedError('')
+        if not self._isStream:
+            alSourcef(self._sourceID, AL_SEC_OFFSET, value)
+            self._checkError()
+            return
+
+        # restart the decoding at the new time, with fresh buffers
+        wasPlaying = self.state == StatesEnum.Playing
+        filler = self.filler
+        filler.terminate()
+        reader = filler.audioReader
+        reader.initialize(value)
+        startFrame = reader.pos
+        self.filler = BufferFillingThread(self._device, self._sourceID, self._bufferSize, self._maxBufferNumber, reader,
+                                          self._lookAhead)
+        self.filler._playedBuffersLenght = startFrame
+        self.filler.start()
+        if wasPlaying:
+            self.play()
 
     @property
     def length(self):
-        return self._nframes / self._fps
+        nframes = self._nframes
+        if nframes is None and self.filler is not None and self.filler.audioReader.eof:
+            nframes = self._nframes = self.filler.audioReader.pos
+        if nframes is None:
+            # streamed from a pipe and not fully decoded yet
+            return None
+        return nframes / self._fps
 
     @length.setter
     def length(self, value):
         raise NotImplementedError('')
 
+    @property
+    def bufferedTime(self):
+        """Seconds of decoded audio waiting in the look-ahead ring of a stream."""
+        if self.filler is None:
+            return None
+        return self.filler.decoder.bufferedFrames / float(self._fps)
+
+    @property
+    def ringLevel(self):
+        """Fill level, from 0 to 1, of the look-ahead ring of a stream."""
+        if self.filler is None:
+            return None
+        return self.filler.decoder.level
+
     @property
     def position(self):
-        raise NotImplementedError('')
+        x, y, z = ALfloat(), ALfloat(), ALfloat()
+        alGetSource3f(self._sourceID, AL_POSITION, byref(x), byref(y), byref(z))
+        self._checkError()
+        return [x.value, y.value, z.value]
 
     @position.setter
     def position(self, value):
@@ -159,7 +231,7 @@ class Sound(object):
 
     @property
     def volume(self):
-        val = ALuint()
+        val = ALfloat()
         alGetSourcef(self._sourceID, AL_GAIN, byref(val))
         self._checkError()
         return val.value * 100
@@ -171,7 +243,7 @@ class Sound(object):
 
     @property
     def pitch(self):
-        val = ALuint()
+        val = ALfloat()
         alGetSourcef(self._sourceID, AL_PITCH, byref(val))
         self._checkError()
         return val.value * 100
@@ -212,37 +284,145 @@ class Sound(object):
     def _checkError(self):
         _ckerr(self._device)
 
+    def fadeTo(self, volume, seconds, curve='linear', onFinished=None):
+        """Ramps the volume to ``volume`` in ``seconds``, driven by the automation of the manager."""
+        return self._manager.automation.ramp(self, 'volume', volume, seconds, curve, onFinished=onFinished)
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def close(self):
+        """Release the AL source, the buffers and, for streams, the filling thread and the ffmpeg process.
+
+        It is safe to call more than once. The sound can not be used after this.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._manager._sounds.discard(self)
+        if self._manager._automation is not None:
+            self._manager._automation.cancel(self)
+
+        sourceID = self._sourceID
+        if sourceID is not None:
+            alSourceStop(sourceID)
+
+        if self.filler is not None:
+            self.filler.terminate()
+            self.filler = None
+
+        if sourceID is not None:
+            alSourcei(sourceID, AL_BUFFER, 0)
+            alDeleteSources(1, byref(sourceID))
+            self._sourceID = None
+
+        bufferID = self._bufferID
+        if bufferID is not None:
+            self._bufferID = None
+            if self._manager._releaseBuffer(bufferID.value):
+                # next raises 'NameError: name 'alDeleteBuffers' is not defined' when imported with *
+                delBuff(1, byref(bufferID))
+        self._checkError()
+
     def _terminate(self):
-        self.__del__()
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
 
     def __del__(self):
         try:
-            if hasattr(self, '_sourceID'):
-                alDeleteSources(1, self._sourceID)
-            if hasattr(self, '_bufferID'):
-                # next raises 'NameError: name 'alDeleteBuffers' is not defined' when imported with *
-                delBuff(1, self._bufferID)
-            if self._isStream:
-                self.filler.terminate()
-
+            self.close()
         except Exception as err:
             warn(str(err))
 
     def copy(self):
-        return Sound(self._manager, self, self._isStream, self._bufferSize, self.maxBufferN)
+        return Sound(self._manager, self, self._isStream, self._bufferSize, self._maxBufferNumber, self._lookAhead)
+
+
+class DecodingThread(Thread):
+    """
+    Reads chunks ahead from the reader into a bounded ring, so a slow
+    decode or a disk hiccup does not delay the refill of the AL queue.
+    """
+
+    def __init__(self, audioReader, chunkSize, ringSize):
+        super(DecodingThread, self).__init__()
+        self.daemon = True
+        self.audioReader = audioReader
+        self.chunkSize = chunkSize
+        self.ringSize = ringSize
+        self.ring = deque()
+        self.eof = False
+        self.isFinished = False
+        self._frameSize = audioReader.nchannels * audioReader.nbytes
+        self._condition = Condition()
+
+    @property
+    def bufferedFrames(self):
+        return sum(len(chunk) for chunk in list(self.ring)) // self._frameSize
+
+    @property
+    def level(self):
+        return len(self.ring) / float(self.ringSize)
+
+    @property
+    def finished(self):
+        """True when everything was decoded and taken from the ring."""
+        return self.eof and not self.ring
+
+    def run(self):
+        reader = self.audioReader
+        condition = self._condition
+        while not reader.eof:
+            with condition:
+                while not self.isFinished and len(self.ring) >= self.ringSize:
+                    condition.wait()
+                if self.isFinished:
+                    return
+            # the pipe read happens without holding the lock
+            chunk = reader.read_chunk(self.chunkSize)
+            if chunk:
+                self.ring.append(chunk)
+        self.eof = True
+
+    def pop(self):
+        """Returns the next ready chunk, or None if there is none. Never waits for the decoder."""
+        with self._condition:
+            if not self.ring:
+                return None
+            chunk = self.ring.popleft()
+            self._condition.notify()
+            return chunk
+
+    def terminate(self):
+        with self._condition:
+            self.isFinished = True
+            self._condition.notify()
+        if self.is_alive() and self is not current_thread():
+            self.join()
 
 
 class BufferFillingThread(Thread):
-    def __init__(self, device, sourceID, bufferSize, maxBufferNumber, audioReader):
+    def __init__(self, device, sourceID, bufferSize, maxBufferNumber, audioReader, lookAhead=2.0):
         super(BufferFillingThread, self).__init__()
+        # a forgotten stream must not keep the interpreter alive
+        self.daemon = True
         self.device = device
         self.sourceID = sourceID
         self.bufferSize = bufferSize
         self.maxBufferNumber = maxBufferNumber
         self.audioReader = audioReader
         self.buffers = []
+        self._queuedFrames = deque()
         self._playedBuffersLenght = 0
         self.isFinished = False
+        # a quarter of a buffer, the other queued buffers keep the source playing meanwhile
+        self.pollInterval = bufferSize / float(audioReader.fps) / 4
 
         # create buffers
         buffers = (ALuint * maxBufferNumber)()
@@ -255,6 +435,9 @@ class BufferFillingThread(Thread):
             self.uploadData(availableBufferID, chunk)
             self.queueBuffer(availableBufferID)
 
+        ringSize = max(1, int(ceil(lookAhead * audioReader.fps / float(bufferSize))))
+        self.decoder = DecodingThread(audioReader, bufferSize, ringSize)
+
     @property
     def playedLength(self):
         return self._playedBuffersLenght
@@ -262,32 +445,34 @@ class BufferFillingThread(Thread):
     def run(self):
         processedBuffers = ALint()
         availableBufferID = ALuint()
-        chunk = None
-        reader = self.audioReader
-        bufferSize = self.bufferSize
+        decoder = self.decoder
         sourceID = self.sourceID
 
-        while not self.isFinished:
-            if chunk is None and reader.pos < reader.nframes:
-                # read audio chunk from file
-                chunk = reader.read_chunk(bufferSize)
-
+        decoder.start()
+        # once everything is decoded and queued there is nothing left to refill
+        while not self.isFinished and not decoder.finished:
             # find out if there are free buffers
             alGetSourcei(sourceID, AL_BUFFERS_PROCESSED, byref(processedBuffers))
             self._checkError()
 
-            if processedBuffers.value > 0 and chunk is not None:
-                # new buffer available
-                self._playedBuffersLenght += bufferSize
+            processed = processedBuffers.value
+            while processed > 0:
+                # only already decoded chunks are used
+                chunk = decoder.pop()
+                if chunk is None:
+                    break
 
                 # unqueue buffer from source to reuse it
                 self.unQueueBuffer(availableBufferID)
+                self._playedBuffersLenght += self._queuedFrames.popleft()
 
                 # upload data to buffer
                 self.uploadData(availableBufferID, chunk)
                 # queue buffer into source
                 self.queueBuffer(availableBufferID)
-                chunk = None
+                processed -= 1
+
+            sleep(self.pollInterval)
 
     def queueBuffer(self, availableBufferID):
         alSourceQueueBuffers(self.sourceID, 1, byref(availableBufferID))
@@ -302,15 +487,31 @@ class BufferFillingThread(Thread):
         alBufferData(availableBufferID, to_al_format(reader.nchannels, 8 * reader.nbytes), chunk, len(chunk),
                      reader.fps)
         self._checkError()
+        self._queuedFrames.append(len(chunk) // (reader.nchannels * reader.nbytes))
 
     def _checkError(self):
         _ckerr(self.device)
 
     def terminate(self):
         self.isFinished = True
-        self.__del__()
+        self.decoder.terminate()
+        if self.is_alive() and self is not current_thread():
+            self.join()
+        self.release()
+
+    def release(self):
+        """Detach and delete the queued buffers and stop the ffmpeg process."""
+        if self.buffers:
+            alSourceStop(self.sourceID)
+            alSourcei(self.sourceID, AL_BUFFER, 0)
+        while len(self.buffers) > 0:
+            bufferID = ALuint(self.buffers.pop())
+            delBuff(1, byref(bufferID))
+        self._queuedFrames.clear()
+        self.audioReader.close_proc()
 
     def __del__(self):
-        while len(self.buffers) < 0:
-            bufferID = ALuint(self.buffers.pop())
-            delBuff(1, bufferID)
+        try:
+            self.release()
+        except Exception as err:
+            warn(str(err))
@@ -0,0 +1,59 @@
+from openal.al import *
+
+from ._errorChecking import _checkError as _ckerr
+
+
+class SoundGroup(object):
+    """
+    Several sounds controlled as one. Each call issues a single AL call
+    for all the sources, so they start, pause and stop on the same sample.
+    """
+
+    def __init__(self, sounds):
+        self._sounds = list(sounds)
+        if not self._sounds:
+            raise ValueError('a sound group needs at least one sound')
+        self._device = self._sounds[0]._device
+        # pending start from Manager.playGroup(..., at=...)
+        self.scheduled = None
+
+    @property
+    def sounds(self):
+        return list(self._sounds)
+
+    def __len__(self):
+        return len(self._sounds)
+
+    def __iter__(self):
+        return iter(self._sounds)
+
+    def _sources(self):
+        sources = []
+        for sound in self._sounds:
+            if sound.closed:
+                raise RuntimeError('a sound of the group is closed')
+            sources.append(sound._sourceID.value)
+        return (ALuint * len(sources))(*sources)
+
+    def play(self):
+        sources = self._sources()
+        alSourcePlayv(len(sources), sources)
+        self._checkError()
+
+    def pause(self):
+        sources = self._sources()
+        alSourcePausev(len(sources), sources)
+        self._checkError()
+
+    def stop(self):
+        sources = self._sources()
+        alSourceStopv(len(sources), sources)
+        self._checkError()
+
+    def rewind(self):
+        sources = self._sources()
+        alSourceRewindv(len(sources), sources)
+        self._checkError()
+
+    def _checkError(self):
+        _ckerr(self._device)
@@ -1,8 +1,14 @@
 from openal.al import *
 from openal.alc import *
 import ctypes
+from warnings import warn
+from weakref import WeakSet
 
+from .Automation import Automation
+from .Scheduler import Scheduler, clock
 from .Sound import Sound
+from .SoundGroup import SoundGroup
+from .ffmpeg_reader import FFMPEG_DecoderPool
 from ._errorChecking import _checkError as _ckerr
 
 
@@ -36,10 +42,19 @@ class Listener(object):
 
 
 class Manager(object):
-    def __init__(self, ffmpegPath='ffmpeg'):
+    def __init__(self, ffmpegPath='ffmpeg', decoderProcesses=2):
         self._ffmpegPath = ffmpegPath
+        self._decoderProcesses = decoderProcesses
+        self._decoderPool = None
         self._device = None
-        self._sounds = []
+        self._context = None
+        # weak registries, so dropped sounds can be collected
+        self._sounds = WeakSet()
+        self._readers = WeakSet()
+        # AL buffer name -> number of sounds bound to it (copies share the buffer)
+        self._bufferRefs = {}
+        self._scheduler = None
+        self._automation = None
 
         device = alcOpenDevice(None)
         self._checkError()
@@ -64,19 +79,138 @@ class Manager(object):
     def _checkError(self):
         _ckerr(self._device)
 
-    def terminate(self):
-        self.__del__()
+    @property
+    def clock(self):
+        """Current time, in seconds, of the clock used by ``at`` arguments."""
+        return clock()
+
+    def _getScheduler(self):
+        if self._scheduler is None:
+            self._scheduler = Scheduler()
+            self._scheduler.start()
+        return self._scheduler
+
+    def preload(self, filePaths, bufferSize=48000, ignoreErrors=False):
+        """Creates a static Sound for each of ``filePaths``.
+
+        The files are decoded together by a pool of at most ``decoderProcesses`` ffmpeg processes, instead of one
+        process per file. A file that can not be decoded does not affect the others. If any fails, all the sounds
+        created are closed and the first error is raised; with ``ignoreErrors`` its place in the returned list is
+        None instead, and a warning is issued. Where the pool can not multiplex its inputs, the files are decoded
+        one after another instead.
+        """
+        filePaths = list(filePaths)
+        if self._decoderPool is None:
+            self._decoderPool = FFMPEG_DecoderPool(self._ffmpegPath, self._decoderProcesses)
+        readers = self._decoderPool.open(filePaths)
+        sounds = []
+        error = None
+        for filePath, reader in zip(filePaths, readers):
+            try:
+                sounds.append(Sound(self, filePath, bufferSize=bufferSize, reader=reader))
+            except Exception as err:
+                if not ignoreErrors:
+                    error = err
+                    break
+                warn(str(err))
+                sounds.append(None)
+        if error is not None:
+            for sound in sounds:
+                sound.close()
+            for reader in readers:
+                if reader is not None:
+                    reader.close_proc()
+            raise error
+        return sounds
 
-    def __del__(self):
-        for s in self._sounds:
-            s._terminate()
-        if hasattr(self, '_context'):
+    @property
+    def automation(self):
+        if self._automation is None:
+            self._automation = Automation(self)
+        return self._automation
+
+    def crossfade(self, fromSound, toSound, seconds, volume=100, curve='equalPower'):
+        self.automation.crossfade(fromSound, toSound, seconds, volume, curve)
+
+    def playGroup(self, sounds, at=None):
+        """Starts all the sounds with a single AL call, now or when ``clock`` reaches ``at``.
+
+        Returns the SoundGroup. A scheduled start is kept in its ``scheduled`` attribute and can be cancelled.
+        """
+        if isinstance(sounds, SoundGroup):
+            group = sounds
+        else:
+            group = SoundGroup(sounds)
+        if at is None:
+            group.play()
+        else:
+            group.scheduled = self._getScheduler().schedule(at, group.play)
+        return group
+
+    def _retainBuffer(self, bufferID):
+        self._bufferRefs[bufferID] = self._bufferRefs.get(bufferID, 0) + 1
+
+    def _releaseBuffer(self, bufferID):
+        """Returns True when no sound uses the buffer anymore and it must be deleted."""
+        count = self._bufferRefs.get(bufferID, 0) - 1
+        if count > 0:
+            self._bufferRefs[bufferID] = count
+            return False
+        self._bufferRefs.pop(bufferID, None)
+        return True
+
+    def resources(self):
+        """Returns the number of live sounds, AL sources, AL buffers, streaming threads and ffmpeg processes."""
+        counts = {'sounds': 0, 'sources': 0, 'buffers': len(self._bufferRefs), 'streams': 0, 'processes': 0}
+        for sound in list(self._sounds):
+            counts['sounds'] += 1
+            if sound._sourceID is not None:
+                counts['sources'] += 1
+            filler = sound.filler
+            if filler is not None:
+                counts['buffers'] += len(filler.buffers)
+                if filler.is_alive():
+                    counts['streams'] += 1
+        # readers of the decoder pool share their process
+        processes = set(id(reader.proc) for reader in list(self._readers) if reader.proc is not None)
+        counts['processes'] = len(processes)
+        return counts
+
+    def terminate(self):
+        if self._automation is not None:
+            self._automation.terminate()
+            self._automation = None
+        if self._scheduler is not None:
+            self._scheduler.terminate()
+            self._scheduler = None
+        if self._decoderPool is not None:
+            self._decoderPool.terminate()
+            self._decoderPool = None
+        for s in list(self._sounds):
+            s.close()
+        for reader in list(self._readers):
+            reader.close_proc()
+        if self._context is not None:
             context = self._context
+            self._context = None
             device = alcGetContextsDevice(context)
             alcMakeContextCurrent(None)
             alcDestroyContext(context)
             alcCloseDevice(device)
-        else:
-            if hasattr(self, '_device'):
-                device = self._device
-                alcCloseDevice(device)
+            self._device = None
+        elif self._device is not None:
+            device = self._device
+            self._device = None
+            alcCloseDevice(device)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.terminate()
+
+    def __del__(self):
+        try:
+            self.terminate()
+        except Exception as err:
+            warn(str(err))
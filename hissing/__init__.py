@@ -1,2 +1,4 @@
 from .Sound import Sound, StatesEnum
 from .SoundManager import Manager
+from .SoundGroup import SoundGroup
+from .AudioServer import RemoteManager, RemoteSound
@@ -14,14 +14,153 @@ import re
 import subprocess as sp
 import time
 import warnings
+from collections import deque
+from threading import BoundedSemaphore, Condition, Thread, current_thread
+from weakref import WeakSet
+try:
+    import selectors
+except ImportError:
+    selectors = None
 # import numpy as np
 
 FFMPEG_PATH = 'ffmpeg'
 
+try:
+    _PATH_TYPES = (str, unicode)
+except NameError:
+    _PATH_TYPES = (str,)
+
+
+def is_path(source):
+    if hasattr(source, '__fspath__'):
+        return True
+    # on Python 2 encoded audio is a str too, but a path can not contain a NUL
+    return isinstance(source, _PATH_TYPES) and '\0' not in source
+
+
+def _is_seekable(fileObj):
+    try:
+        return fileObj.seekable()
+    except AttributeError:
+        try:
+            fileObj.tell()
+            return True
+        except Exception:
+            return False
+
+
+class InputSource(object):
+    """
+    The input of a reader: a path, a bytes-like object (``bytes``,
+    ``bytearray``, ``memoryview``...) or a readable file-like object.
+
+    Paths are handed to ffmpeg as they are. Anything else is written to
+    the stdin of ffmpeg by an ``InputFeeder``, straight from the caller's
+    memory or file object, without going through a temporary file.
+
+    A file object that can not seek is read as it is fed, so it can only
+    be decoded once: no seeking, copying or probing.
+    """
+
+    def __init__(self, source, chunkSize=65536):
+        self.path = None
+        self.data = None
+        self.file = None
+        self.start = 0
+        self.seekable = True
+        self.claimed = False
+        self.chunkSize = chunkSize
+
+        if is_path(source):
+            self.path = os.path.abspath(source)
+        elif hasattr(source, 'read'):
+            self.file = source
+            if _is_seekable(source):
+                self.start = source.tell()
+            else:
+                self.seekable = False
+        else:
+            view = memoryview(source)
+            if hasattr(view, 'cast'):
+                view = view.cast('B')
+            self.data = view
+
+    @property
+    def isPipe(self):
+        return self.path is None
+
+    @property
+    def name(self):
+        if self.path is not None:
+            return self.path
+        return '<in-memory input>'
+
+    @property
+    def ffmpegInput(self):
+        if self.path is not None:
+            return self.path
+        return 'pipe:0'
+
+    def claim(self):
+        """Called before each decoding. Fails if a one-shot input was already used."""
+        if self.claimed and not self.seekable:
+            raise IOError('a file object that can not seek can only be decoded once')
+        self.claimed = True
+
+    def chunks(self):
+        size = self.chunkSize
+        if self.data is not None:
+            data = self.data
+            for start in range(0, len(data), size):
+                yield data[start:start + size]
+        else:
+            fileObj = self.file
+            if self.seekable:
+                fileObj.seek(self.start)
+            while True:
+                chunk = fileObj.read(size)
+                if not chunk:
+                    break
+                yield chunk
+
+
+class InputFeeder(Thread):
+    """Writes an ``InputSource`` into the stdin pipe of an ffmpeg process."""
+
+    def __init__(self, source, pipe):
+        super(InputFeeder, self).__init__()
+        self.daemon = True
+        self.source = source
+        self.pipe = pipe
+
+    def run(self):
+        try:
+            for chunk in self.source.chunks():
+                self.pipe.write(chunk)
+        except (IOError, OSError, ValueError):
+            # ffmpeg is gone or the pipe was closed: nothing else to feed
+            pass
+        finally:
+            try:
+                self.pipe.close()
+            except (IOError, OSError, ValueError):
+                pass
+
+
+def _start_feeder(proc, source):
+    if not source.isPipe:
+        return None
+    feeder = InputFeeder(source, proc.stdin)
+    feeder.start()
+    return feeder
+
 
 def ffmpeg_parse_infos(filename, print_infos=False, check_duration=True, fps_source='tbr'):
     """Get file infos using ffmpeg.
 
+    ``filename`` can also be an ``InputSource``, or anything that can
+    be wrapped into one, to probe data that is not on disk.
+
     Returns a dictionnary with the fields:
     "video_found", "video_fps", "duration", "video_nframes",
     "video_duration", "audio_found", "audio_fps"
@@ -31,19 +170,35 @@ def ffmpeg_parse_infos(filename, print_infos=False, check_duration=True, fps_sou
 
     """
 
+    if isinstance(filename, InputSource):
+        source = filename
+    else:
+        source = InputSource(filename)
+    filename = source.name
+
+    source.claim()
+
     # open the file in a pipe, provoke an error, read output
-    cmd = [FFMPEG_PATH, "-i", filename]
+    cmd = [FFMPEG_PATH, "-i", source.ffmpegInput]
 
     popen_params = {"bufsize": 10 ** 5, "stdout": sp.PIPE, "stderr": sp.PIPE}
+    if source.isPipe:
+        popen_params["stdin"] = sp.PIPE
 
     if os.name == "nt":
         popen_params["creationflags"] = 0x08000000
 
     proc = sp.Popen(cmd, **popen_params)
+    feeder = _start_feeder(proc, source)
 
     proc.stdout.readline()
     proc.terminate()
     infos = proc.stderr.read().decode('utf8')
+    for std in [proc.stdout, proc.stderr]:
+        std.close()
+    if feeder is not None:
+        feeder.join()
+    proc.wait()
     del proc
 
     if print_infos:
@@ -66,8 +221,10 @@ def ffmpeg_parse_infos(filename, print_infos=False, check_duration=True, fps_sou
             keyword = 'Duration: '
             index = 0
             line = [l for l in lines if keyword in l][index]
-            match = re.findall("([0-9][0-9]:[0-9][0-9]:[0-9][0-9].[0-9][0-9])", line)[0]
-            result['duration'] = convertTime(match)
+            if keyword + 'N/A' not in line:
+                # inputs read from a pipe may not know their duration in advance
+                match = re.findall("([0-9][0-9]:[0-9][0-9]:[0-9][0-9].[0-9][0-9])", line)[0]
+                result['duration'] = convertTime(match)
         except Exception as Ex:
             raise IOError((str(Ex) + " error: failed to read the duration of file %s.\n"
                                      "Here are the file infos returned by ffmpeg:\n\n%s") % (filename, infos))
@@ -133,7 +290,7 @@ def ffmpeg_parse_infos(filename, print_infos=False, check_duration=True, fps_sou
             if (fps != x) and abs(fps - x * coef) < .01:
                 result['video_fps'] = x * coef
 
-        if check_duration:
+        if check_duration and result['duration'] is not None:
             result['video_nframes'] = int(result['duration'] * result['video_fps']) + 1
             result['video_duration'] = result['duration']
         else:
@@ -182,7 +339,9 @@ class FFMPEG_AudioReader:
 
     filename
       Name of any video or audio file, like ``video.mp4`` or
-      ``sound.wav`` etc.
+      ``sound.wav`` etc. It can also be the encoded file itself, as a
+      bytes-like object or a readable file-like object, which is fed
+      to ffmpeg through its stdin.
 
     buffersize
       The size of the buffer to use. Should be bigger than the buffer
@@ -206,23 +365,34 @@ class FFMPEG_AudioReader:
         global FFMPEG_PATH
         FFMPEG_PATH = ffmpegPath
 
-        self.filename = os.path.abspath(filename)
+        self.source = InputSource(filename)
+        self.filename = self.source.name
         self.nbytes = nbytes
         self.fps = fps
         self.f = 's%dle' % (8 * nbytes)
         self.acodec = 'pcm_s%dle' % (8 * nbytes)
         self.nchannels = nchannels
-        infos = ffmpeg_parse_infos(self.filename)
-        self.duration = infos['duration']
+        if self.source.isPipe:
+            # piped inputs are not probed, they are fed once and the length is known once decoded
+            infos = {'duration': None}
+        else:
+            infos = ffmpeg_parse_infos(self.source)
         if 'video_duration' in infos:
             self.duration = infos['video_duration']
         else:
             self.duration = infos['duration']
         self.infos = infos
         self.proc = None
+        self.feeder = None
         self.pos = 0
-        self.nframes = int(self.fps * self.duration)
-        self.buffersize = min(self.nframes + 1, buffersize)
+        self.eof = False
+        if self.duration is None:
+            # unknown until the whole input is decoded
+            self.nframes = None
+            self.buffersize = buffersize
+        else:
+            self.nframes = int(self.fps * self.duration)
+            self.buffersize = min(self.nframes + 1, buffersize)
         self.buffer = None
         self.buffer_startframe = 1
         self.initialize()
@@ -233,23 +403,32 @@ class FFMPEG_AudioReader:
 
         self.close_proc()  # if any
 
-        if starttime != 0:
+        source = self.source
+        if starttime != 0 and source.isPipe:
+            # a pipe can not be seeked, so decode and discard up to starttime
+            i_arg = ['-i', source.ffmpegInput, '-vn', "-ss", "%.05f" % starttime]
+        elif starttime != 0:
             offset = min(1, starttime)
-            i_arg = ["-ss", "%.05f" % (starttime - offset), '-i', self.filename, '-vn', "-ss", "%.05f" % offset]
+            i_arg = ["-ss", "%.05f" % (starttime - offset), '-i', source.ffmpegInput, '-vn', "-ss", "%.05f" % offset]
         else:
-            i_arg = ['-i', self.filename, '-vn']
+            i_arg = ['-i', source.ffmpegInput, '-vn']
 
         cmd = ([FFMPEG_PATH] + i_arg + ['-loglevel', 'error', '-f', self.f, '-acodec', self.acodec,
                                         '-ar', "%d" % self.fps, '-ac', '%d' % self.nchannels, '-'])
 
         popen_params = {"bufsize": self.buffersize, "stdout": sp.PIPE, "stderr": sp.PIPE}
+        if source.isPipe:
+            source.claim()
+            popen_params["stdin"] = sp.PIPE
 
         if os.name == "nt":
             popen_params["creationflags"] = 0x08000000
 
         self.proc = sp.Popen(cmd, **popen_params)
+        self.feeder = _start_feeder(self.proc, source)
 
         self.pos = round(self.fps * starttime)
+        self.eof = False
 
     def skip_chunk(self, chunksize):
         self.proc.stdout.read(self.nchannels * chunksize * self.nbytes)
@@ -261,7 +440,9 @@ class FFMPEG_AudioReader:
         chunksize = int(round(chunksize))
         L = self.nchannels * chunksize * self.nbytes
         s = self.proc.stdout.read(L)
-        self.pos = self.pos + chunksize
+        if len(s) < L:
+            self.eof = True
+        self.pos = self.pos + len(s) // (self.nchannels * self.nbytes)
         return s
 
     def seek(self, pos):
@@ -286,11 +467,16 @@ class FFMPEG_AudioReader:
             self.proc.terminate()
             for std in [self.proc.stdout, self.proc.stderr]:
                 std.close()
+            if self.feeder is not None:
+                self.feeder.join()
+                self.feeder = None
+            # reap the child so it does not linger as a zombie
+            self.proc.wait()
             self.proc = None
 
     def get_frame(self, tt):
         ind = int(self.fps * tt)
-        if ind < 0 or ind > self.nframes:  # out of time: return 0
+        if ind < 0 or (self.nframes is not None and ind > self.nframes):  # out of time: return 0
             return bytes(self.nchannels)
 
         # if not (0 <= (ind - self.buffer_startframe) < len(self.buffer)):
@@ -331,6 +517,279 @@ class FFMPEG_AudioReader:
         self.close_proc()
 
 
+class FFMPEG_MultiplexedReader(object):
+    """
+    Reader of one of the inputs decoded by a shared ffmpeg process of a
+    ``FFMPEG_DecoderPool``. It can only be read from start to end, and
+    only once its batch is finished: a failed batch is decoded again, one
+    input at a time, so its data is not final until then.
+    """
+
+    def __init__(self, filename, fps=44100, nbytes=2, nchannels=2):
+        self.source = InputSource(filename)
+        self.filename = self.source.name
+        self.nbytes = nbytes
+        self.fps = fps
+        self.nchannels = nchannels
+        self.f = 's%dle' % (8 * nbytes)
+        self.acodec = 'pcm_s%dle' % (8 * nbytes)
+        # the inputs are not probed, the length is known once everything is read
+        self.duration = None
+        self.nframes = None
+        self.proc = None
+        self.pos = 0
+        self.eof = False
+        self._chunks = deque()
+        self._size = 0
+        self._done = False
+        self._error = None
+        self._closed = False
+        self._condition = Condition()
+
+    def _feed(self, data):
+        with self._condition:
+            if self._closed:
+                # nobody will read it
+                return
+            self._chunks.append(data)
+            self._size += len(data)
+            self._condition.notify()
+
+    def _finish(self, error=None):
+        with self._condition:
+            self._done = True
+            self._error = error
+            self.proc = None
+            self._condition.notify()
+
+    def _reset(self):
+        """Drops the data of a failed batch before decoding the input again."""
+        with self._condition:
+            self._chunks.clear()
+            self._size = 0
+
+    def read_chunk(self, chunksize):
+        chunksize = int(round(chunksize))
+        L = self.nchannels * chunksize * self.nbytes
+        with self._condition:
+            while not self._done:
+                self._condition.wait()
+            if self._error is not None:
+                raise IOError(self._error)
+            chunks = self._chunks
+            pieces = []
+            missing = min(L, self._size)
+            while missing > 0:
+                piece = chunks.popleft()
+                if len(piece) > missing:
+                    chunks.appendleft(piece[missing:])
+                    piece = piece[:missing]
+                pieces.append(piece)
+                missing -= len(piece)
+            s = b''.join(pieces)
+            self._size -= len(s)
+        if len(s) < L:
+            self.eof = True
+        self.pos = self.pos + len(s) // (self.nchannels * self.nbytes)
+        return s
+
+    def close_proc(self):
+        # the process is shared, it ends by itself when all its inputs are decoded
+        with self._condition:
+            self._closed = True
+            self._chunks.clear()
+            self._size = 0
+
+
+class _MultiplexedJob(Thread):
+    """Decodes a batch of readers with one ffmpeg process, demultiplexing its outputs."""
+
+    def __init__(self, pool, readers):
+        super(_MultiplexedJob, self).__init__()
+        self.daemon = True
+        self.pool = pool
+        self.readers = readers
+        self.proc = None
+
+    def run(self):
+        with self.pool._slots:
+            if self.pool.isFinished:
+                for reader in self.readers:
+                    reader._finish('the decoder pool was terminated')
+                return
+            readers = self.readers
+            error = self._tryDecode(readers)
+            if error is not None and len(readers) > 1 and not self.pool.isFinished:
+                # one bad input (corrupt, or without audio) fails the whole process:
+                # find out which one decoding them separately
+                for reader in readers:
+                    if self.pool.isFinished:
+                        reader._finish('the decoder pool was terminated')
+                        continue
+                    reader._reset()
+                    reader._finish(self._tryDecode([reader]))
+            else:
+                for reader in readers:
+                    reader._finish(error)
+
+    def _tryDecode(self, readers):
+        """Returns the error message, or None if everything was decoded."""
+        try:
+            return self._decode(readers)
+        except Exception as err:
+            return str(err)
+
+    def _decode(self, readers):
+        cmd = [self.pool.ffmpegPath, '-loglevel', 'error', '-nostdin']
+        childFds = []
+        inputs = []
+        outputs = {}
+        try:
+            for reader in readers:
+                source = reader.source
+                if source.isPipe:
+                    # a retried batch can not feed a one-shot input again
+                    source.claim()
+                    # every in-memory input gets its own pipe, stdin can only carry one
+                    readFd, writeFd = os.pipe()
+                    childFds.append(readFd)
+                    inputs.append((source, writeFd))
+                    cmd += ['-i', 'pipe:%d' % readFd]
+                else:
+                    cmd += ['-i', source.ffmpegInput]
+            for i, reader in enumerate(readers):
+                readFd, writeFd = os.pipe()
+                childFds.append(writeFd)
+                outputs[readFd] = reader
+                cmd += ['-map', '%d:a:0' % i, '-f', reader.f, '-acodec', reader.acodec, '-ar', '%d' % reader.fps,
+                        '-ac', '%d' % reader.nchannels, 'pipe:%d' % writeFd]
+
+            self.proc = proc = sp.Popen(cmd, stderr=sp.PIPE, pass_fds=childFds)
+        except Exception:
+            for fd in [writeFd for _, writeFd in inputs] + list(outputs):
+                os.close(fd)
+            raise
+        finally:
+            # the child has its own copies now
+            for fd in childFds:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        for reader in readers:
+            reader.proc = proc
+        if self.pool.isFinished:
+            # terminated while the process was starting, it did not see it
+            proc.terminate()
+
+        feeders = []
+        for source, writeFd in inputs:
+            feeder = InputFeeder(source, os.fdopen(writeFd, 'wb'))
+            feeder.start()
+            feeders.append(feeder)
+
+        # every output is drained as soon as it has data, so a slow consumer never stalls ffmpeg
+        errors = []
+        selector = selectors.DefaultSelector()
+        for fd in outputs:
+            selector.register(fd, selectors.EVENT_READ)
+        selector.register(proc.stderr.fileno(), selectors.EVENT_READ)
+        pending = len(outputs) + 1
+        while pending:
+            for key, _ in selector.select():
+                fd = key.fd
+                data = os.read(fd, 65536)
+                if fd in outputs:
+                    if data:
+                        outputs[fd]._feed(data)
+                        continue
+                elif data:
+                    errors.append(data)
+                    continue
+                selector.unregister(fd)
+                pending -= 1
+        selector.close()
+        for fd in outputs:
+            os.close(fd)
+        proc.stderr.close()
+
+        for feeder in feeders:
+            feeder.join()
+        returnCode = proc.wait()
+        self.proc = None
+        for reader in readers:
+            reader.proc = None
+        if returnCode != 0:
+            return b''.join(errors).decode('utf8', 'replace') or 'ffmpeg exited with code %d' % returnCode
+        return None
+
+    def terminate(self):
+        proc = self.proc
+        if proc is not None:
+            proc.terminate()
+
+
+class FFMPEG_DecoderPool(object):
+    """
+    Decodes many inputs with a few ffmpeg processes.
+
+    The inputs are split in batches of up to ``inputsPerProcess``, each
+    one decoded by a single ffmpeg process with one output pipe per input.
+    At most ``processes`` batches run at the same time, which bounds the
+    number of processes and pipes. The decoded data is kept in memory
+    until read, so this suits preloading static sounds, not streams.
+
+    An input that makes ffmpeg fail only fails its own reader: a failed
+    batch is decoded again with one process per input.
+    """
+
+    def __init__(self, ffmpegPath='ffmpeg', processes=2, inputsPerProcess=32):
+        self.ffmpegPath = ffmpegPath
+        self.processes = processes
+        self.inputsPerProcess = inputsPerProcess
+        self.isFinished = False
+        self._slots = BoundedSemaphore(processes)
+        self._jobs = WeakSet()
+
+    def open(self, filenames, fps=44100, nbytes=2, nchannels=2):
+        """Returns one reader for each of ``filenames``, in the same order.
+
+        Where the inputs can not be multiplexed (Windows, or no ``selectors``) every reader is None instead.
+        """
+        if self.isFinished:
+            raise RuntimeError('the decoder pool was terminated')
+        if os.name == 'nt' or selectors is None:
+            # no way to hand extra pipes to the child or to wait on them. None lets the caller open each input
+            # with its own reader when it needs it, so only one process runs at a time
+            return [None] * len(filenames)
+
+        readers = [FFMPEG_MultiplexedReader(filename, fps, nbytes, nchannels) for filename in filenames]
+        batch = []
+        for reader in readers:
+            source = reader.source
+            if not source.isPipe and not os.path.exists(source.path):
+                # a missing file would make ffmpeg fail the whole batch, it only fails its own reader
+                reader._finish(("error: the file %s could not be found!\n"
+                                "Please check that you entered the correct "
+                                "path.") % source.path)
+            else:
+                batch.append(reader)
+        for start in range(0, len(batch), self.inputsPerProcess):
+            job = _MultiplexedJob(self, batch[start:start + self.inputsPerProcess])
+            self._jobs.add(job)
+            job.start()
+        return readers
+
+    def terminate(self):
+        self.isFinished = True
+        jobs = list(self._jobs)
+        for job in jobs:
+            job.terminate()
+        for job in jobs:
+            if job is not current_thread():
+                job.join()
+
+
 def convertTime(timeStr):
     # https://stackoverflow.com/a/10663851
     main, remain = timeStr.split('.')
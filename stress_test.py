@@ -0,0 +1,272 @@
+"""
+Soak test: creates and destroys sounds for a while and checks that the
+process stays healthy.
+
+It runs on the null device of OpenAL Soft with synthesized sounds, so it
+needs no audio hardware or asset files, only ffmpeg. Memory, open files,
+child processes, AL names left alive by closed sounds, uncollected Sound
+objects and threads are sampled over time, and the run fails if any of
+them grows more than allowed after the warm up. Every AL source and
+buffer of a sound is probed with alIsSource/alIsBuffer once it is
+closed, and the counters keep adding up across managers.
+
+    python stress_test.py --seconds 600 --max-rss-growth 32
+"""
+from __future__ import print_function
+
+import argparse
+import gc
+import io
+import math
+import os
+import struct
+import sys
+import threading
+import time
+import random
+import wave
+from weakref import WeakSet
+
+# must be set before the device is opened
+os.environ.setdefault('ALSOFT_DRIVERS', 'null')
+
+from hissing import Manager, Sound
+from openal.al import alIsBuffer, alIsSource
+
+
+def synthesize(seconds, frequency, fps=44100):
+    """Returns a stereo 16 bits wav file, in memory, with a sine tone."""
+    nframes = int(seconds * fps)
+    step = 2 * math.pi * frequency / fps
+    frames = b''.join(struct.pack('<hh', int(12000 * math.sin(i * step)), int(12000 * math.sin(i * step)))
+                      for i in range(nframes))
+    data = io.BytesIO()
+    wav = wave.open(data, 'wb')
+    wav.setnchannels(2)
+    wav.setsampwidth(2)
+    wav.setframerate(fps)
+    wav.writeframes(frames)
+    wav.close()
+    return data.getvalue()
+
+
+def getRSS():
+    """Resident memory in MB."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2.0 ** 20
+    except (IOError, OSError):
+        import resource
+        # peak instead of current, still good to catch a growth
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def countFiles():
+    try:
+        return len(os.listdir('/proc/self/fd'))
+    except OSError:
+        return 0
+
+
+def countChildren():
+    """Child processes, zombies included."""
+    pid = str(os.getpid())
+    count = 0
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return 0
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open('/proc/%s/stat' % entry) as stat:
+                # the fields after the command name are: state, parent pid...
+                fields = stat.read().rsplit(')', 1)[1].split()
+        except (IOError, OSError):
+            continue
+        if fields[1] == pid:
+            count += 1
+    return count
+
+
+def alNames(sound):
+    """AL sources and buffers of a sound, to check later that they were deleted."""
+    sources = [] if sound._sourceID is None else [sound._sourceID.value]
+    buffers = [] if sound._bufferID is None else [sound._bufferID.value]
+    if sound.filler is not None:
+        buffers.extend(sound.filler.buffers)
+    return sources, buffers
+
+
+class Churn(object):
+    def __init__(self, staticData, streamData, liveStreams=4):
+        self.staticData = staticData
+        self.streamData = streamData
+        self.liveStreams = liveStreams
+        self.created = 0
+        self.destroyed = 0
+        self.managers = 0
+        # AL names still alive after their sounds were closed, over all the managers
+        self.leakedNames = 0
+        # every Sound ever created, to catch the ones that are never collected
+        self.sounds = WeakSet()
+        self.streams = []
+        self.manager = None
+        self.newManager()
+
+    def newManager(self):
+        if self.manager is not None:
+            # terminate must close the sounds still alive, the streams in the middle of a refill included
+            self.streams = []
+            self.manager.terminate()
+        self.manager = Manager()
+        self.managers += 1
+
+    def track(self, sound):
+        self.sounds.add(sound)
+        self.created += 1
+        return sound
+
+    def release(self, sounds, drop=False):
+        """Closes the sounds, or drops them to the garbage collector, and checks their AL names are gone."""
+        sources, buffers = [], []
+        sound = None
+        for sound in sounds:
+            soundSources, soundBuffers = alNames(sound)
+            sources.extend(soundSources)
+            buffers.extend(soundBuffers)
+            if not drop:
+                sound.close()
+        # the loop variable would keep the last sound alive through the collection
+        del sound
+        count = len(sounds)
+        del sounds[:]
+        gc.collect()
+        self.destroyed += count
+        self.leakedNames += sum(1 for name in set(sources) if alIsSource(name))
+        self.leakedNames += sum(1 for name in set(buffers) if alIsBuffer(name))
+
+    def step(self, iteration):
+        manager = self.manager
+
+        # static sounds, its copies, seeks, and sounds closed by a with block or left to the garbage collector
+        sound = self.track(Sound(manager, self.staticData))
+        group = [sound] + [self.track(sound.copy()) for _ in range(3)]
+        for copy in group:
+            copy.play()
+            copy.time = random.uniform(0, copy.length)
+        self.release(group)
+        self.release([self.track(Sound(manager, self.staticData))], drop=True)
+        with self.track(Sound(manager, self.staticData)) as scoped:
+            scoped.play()
+            scoped.volume = 50
+            sources, buffers = alNames(scoped)
+        self.destroyed += 1
+        self.leakedNames += sum(1 for name in sources if alIsSource(name))
+        self.leakedNames += sum(1 for name in buffers if alIsBuffer(name))
+
+        # a few streams stay alive across iterations; they seek, and are closed while they are being refilled
+        stream = self.track(Sound(manager, self.streamData, isStream=True, bufferSize=4410, lookAhead=0.5))
+        stream.play()
+        self.streams.append(stream)
+        for stream in self.streams:
+            if random.random() < 0.3:
+                stream.time = random.uniform(0, stream.length or 1)
+        del stream
+        if len(self.streams) > self.liveStreams:
+            # popped straight into the list, so a dropped stream has no other reference left
+            self.release([self.streams.pop(0)], drop=iteration % 2 == 0)
+
+        if iteration % 10 == 0:
+            preloaded = [self.track(sound) for sound in manager.preload([self.staticData] * 8)]
+            for sound in preloaded:
+                sound.play()
+            self.release(preloaded)
+
+        if iteration % 50 == 49:
+            self.newManager()
+
+    def sample(self):
+        gc.collect()
+        return {'rss'      : getRSS(),
+                'files'    : countFiles(),
+                'children' : countChildren(),
+                'alLeaks'  : self.leakedNames,
+                'sounds'   : len(self.sounds),
+                'threads'  : threading.active_count()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=60, help='duration of the run')
+    parser.add_argument('--warmup', type=float, default=5, help='seconds before taking the baseline sample')
+    parser.add_argument('--interval', type=float, default=5, help='seconds between samples')
+    parser.add_argument('--max-rss-growth', type=float, default=32, help='MB')
+    parser.add_argument('--max-files-growth', type=int, default=8)
+    parser.add_argument('--max-children-growth', type=int, default=2)
+    parser.add_argument('--max-al-leaks-growth', type=int, default=0,
+                        help='AL sources and buffers still alive after their sound was closed')
+    parser.add_argument('--max-sounds-growth', type=int, default=16, help='Sound objects never collected')
+    parser.add_argument('--max-threads-growth', type=int, default=4)
+    args = parser.parse_args()
+
+    limits = {'rss'      : args.max_rss_growth,
+              'files'    : args.max_files_growth,
+              'children' : args.max_children_growth,
+              'alLeaks'  : args.max_al_leaks_growth,
+              'sounds'   : args.max_sounds_growth,
+              'threads'  : args.max_threads_growth}
+    fields = sorted(limits)
+
+    churn = Churn(synthesize(0.5, 440), synthesize(3, 220))
+    start = time.time()
+    baseline = None
+    nextSample = start + args.warmup
+    iteration = 0
+    last = None
+    print('{:>8} {:>10} {:>10}  '.format('time', 'created/s', 'iteration') +
+          ' '.join('{:>10}'.format(field) for field in fields))
+    try:
+        while True:
+            churn.step(iteration)
+            iteration += 1
+            now = time.time()
+            if now >= nextSample:
+                last = churn.sample()
+                if baseline is None:
+                    baseline = last
+                elapsed = now - start
+                print('{:8.1f} {:10.1f} {:10d}  '.format(elapsed, churn.created / elapsed, iteration) +
+                      ' '.join('{:10.1f}'.format(last[field]) for field in fields))
+                sys.stdout.flush()
+                nextSample = now + args.interval
+            if now - start >= args.seconds:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        churn.manager.terminate()
+
+    elapsed = time.time() - start
+    print('\n{} sounds created and {} destroyed in {:.1f} s: {:.1f} created/s, {:.1f} destroyed/s, '
+          '{} managers'.format(churn.created, churn.destroyed, elapsed, churn.created / elapsed,
+                               churn.destroyed / elapsed, churn.managers))
+
+    if baseline is None or last is baseline:
+        print('not enough samples to check the growth, run for longer than the warm up plus one interval')
+        return 1
+    failed = False
+    for field in fields:
+        growth = last[field] - baseline[field]
+        if growth > limits[field]:
+            failed = True
+            print('FAIL {}: grew {:.1f} (from {:.1f} to {:.1f}), limit {}'.format(field, growth, baseline[field],
+                                                                                 last[field], limits[field]))
+    if not failed:
+        print('OK')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())